@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""\
+Benchmarks the content classifier on 10,000 character inputs of each class.
+
+The old detection rebuilt the alphanumeric character set on every call,
+tried the ASCII and shift-jis encodings one after the other, checked the
+characters with map() and combined the kanji bytes pairwise in Python.
+QRCode then encoded the content a second time. It is copied below so the
+two can be compared. Run this from the project's root directory:
+
+    python benchmarks/classify.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pyqrcode import builder, tables
+
+try:
+    str = unicode  # Python 2
+except NameError:
+    pass
+
+INPUTS = (
+    ('numeric', '1234567890' * 1000),
+    ('alphanumeric', 'HELLO WORLD/' * 833 + 'ABCD'),
+    ('binary, ASCII', 'hello world.' * 833 + 'abcd'),
+    ('binary, latin-1', 'Märchenbuch' * 909 + 'M'),
+    ('kanji', '外来語漢字' * 2000),
+    ('binary bytes', bytes(bytearray(range(256))) * 39 + b'\x00' * 16),
+)
+
+
+def old_classify(content, encoding='iso-8859-1'):
+    """The detection and encoding the classifier replaced."""
+    def two_bytes(c):
+        def next_byte(b):
+            if not isinstance(b, int):
+                return ord(b)
+            else:
+                return b
+        for i in range(0, len(c), 2):
+            yield (next_byte(c[i]) << 8) | next_byte(c[i+1])
+
+    def detect():
+        try:
+            if str(content).isdigit():
+                return 'numeric'
+        except (TypeError, UnicodeError):
+            pass
+        valid_characters = ''.join(tables.ascii_codes.keys())
+        valid_characters = valid_characters.encode('ASCII')
+        try:
+            if isinstance(content, bytes):
+                c = content.decode('ASCII')
+            else:
+                c = str(content).encode('ASCII')
+            if all(map(lambda x: x in valid_characters, c)):
+                return 'alphanumeric'
+        except (TypeError, UnicodeError):
+            pass
+        try:
+            if isinstance(content, bytes):
+                c = content.decode('shiftjis').encode('shiftjis')
+            else:
+                c = content.encode('shiftjis')
+            if len(c) % 2 != 0:
+                return 'binary'
+            for asint in two_bytes(c):
+                if not (0x8140 <= asint <= 0x9FFC or
+                        0xE040 <= asint <= 0xEBBF):
+                    return 'binary'
+            return 'kanji'
+        except UnicodeError:
+            pass
+        return 'binary'
+
+    mode = detect()
+    if mode == 'kanji':
+        encoding = 'shiftjis'
+    elif mode == 'alphanumeric':
+        encoding = 'ASCII'
+    if isinstance(content, bytes):
+        return mode, content.decode(encoding)
+    return mode, content.encode(encoding)
+
+
+def bench(label, func, *args):
+    runs = 20
+    best = min(timeit.repeat(lambda: func(*args), number=runs, repeat=5))
+    print('{0:<32} {1:8.3f} ms'.format(label, best / runs * 1000))
+
+
+if __name__ == '__main__':
+    for name, content in INPUTS:
+        assert old_classify(content)[0] == \
+               builder._classify(content, 'iso-8859-1')[0], name
+
+        print('{0} ({1} characters)'.format(name, len(content)))
+        bench('  old detection and encoding', old_classify, content)
+        bench('  classifier', builder._classify, content, 'iso-8859-1')
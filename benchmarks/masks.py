@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""\
+Checks and benchmarks making the eight masked matrices of a code.
+
+The old builder deep copied the template for every mask and walked the
+whole zig-zag placement again, reading the bit stream one character at a
+time, so the data was placed eight times. It is copied below. The masks it
+makes are checked against QRCodeBuilder.make_masks() for a code of each
+version from 1 to 40, then both are timed on a few versions. Run this from
+the project's root directory:
+
+    python benchmarks/masks.py
+"""
+from __future__ import print_function, unicode_literals
+import copy
+import itertools
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pyqrcode import tables
+from penalty import make_builder
+
+ERRORS = 'LMQH'
+TIMED_VERSIONS = (1, 10, 25, 40)
+
+
+def old_masks(qr, template):
+    """The placement loop, run once per mask, make_masks() replaced."""
+    nmasks = len(tables.mask_patterns)
+    masks = [''] * nmasks
+
+    for n in range(nmasks):
+        cur_mask = copy.deepcopy(template)
+        masks[n] = cur_mask
+        qr.add_type_pattern(cur_mask, tables.type_bits[qr.error][n])
+        pattern = tables.mask_patterns[n]
+        bits = iter(qr.buffer.getvalue())
+        row_start = itertools.cycle([len(cur_mask)-1, 0])
+        row_stop = itertools.cycle([-1, len(cur_mask)])
+        direction = itertools.cycle([-1, 1])
+
+        for column in range(len(cur_mask)-1, 0, -2):
+            if column <= 6:
+                column = column - 1
+            column_pair = itertools.cycle([column, column-1])
+            for row in range(next(row_start), next(row_stop),
+                             next(direction)):
+                for i in range(2):
+                    col = next(column_pair)
+                    if cur_mask[row][col] != ' ':
+                        continue
+                    try:
+                        bit = int(next(bits))
+                    except StopIteration:
+                        bit = 0
+                    if pattern(row, col):
+                        cur_mask[row][col] = bit ^ 1
+                    else:
+                        cur_mask[row][col] = bit
+    return masks
+
+
+def old_template(qr):
+    """The template as the old builder used it, a list of lists."""
+    return [list(row) for row in qr.make_template()]
+
+
+if __name__ == '__main__':
+    for version in range(1, 41):
+        qr = make_builder(version, ERRORS[version % 4])
+        expected = old_masks(qr, old_template(qr))
+        assert expected == qr.make_masks(qr.make_template()), version
+    print('The masks of versions 1 to 40 match the old placement')
+
+    for version in TIMED_VERSIONS:
+        qr = make_builder(version, 'M')
+        template = old_template(qr)
+        print('Version {0}, eight masks'.format(version))
+        best = min(timeit.repeat(lambda: old_masks(qr, template), number=1,
+                                 repeat=3))
+        print('  {0:<14} {1:10.2f} ms'.format('old placement', best * 1000))
+        template = qr.make_template()
+        best = min(timeit.repeat(lambda: qr.make_masks(template), number=20,
+                                 repeat=3)) / 20
+        print('  {0:<14} {1:10.2f} ms'.format('make_masks', best * 1000))
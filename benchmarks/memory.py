@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""\
+Measures the memory taken by the module matrix of codes of a few versions,
+and how many of them fit in a gigabyte.
+
+Matrices used to be lists of lists of ints, which take a pointer for every
+module. They are now lists of rows holding one byte per module. The old
+layout is rebuilt below from the new one so the two can be compared. Run
+this from the project's root directory:
+
+    python benchmarks/memory.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pyqrcode
+
+VERSIONS = (1, 5, 10, 25, 40)
+
+
+def matrix_size(matrix):
+    """Returns the bytes taken by the matrix, its rows and their items.
+    The ints 0 and 1 are shared by every list, so they are not counted.
+    """
+    return sys.getsizeof(matrix) + sum(sys.getsizeof(row) for row in matrix)
+
+
+if __name__ == '__main__':
+    print('{0:>7} {1:>12} {2:>12} {3:>14} {4:>14}'
+          .format('version', 'old bytes', 'new bytes', 'old codes/GB',
+                  'new codes/GB'))
+    for version in VERSIONS:
+        code = pyqrcode.create('1', error='L', version=version).code
+        old = matrix_size([list(row) for row in code])
+        new = matrix_size(code)
+        print('{0:>7} {1:>12} {2:>12} {3:>14.0f} {4:>14.0f}'
+              .format(version, old, new, 1e9 / old, 1e9 / new))
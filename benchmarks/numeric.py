@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""\
+Benchmarks the numeric encoder at full capacity (7089 digits, version 40-L).
+
+The old encoder built a small string for every group of three digits and
+formatted it as a string of '0' and '1' characters. It is copied below so
+the two can be compared. Run this from the project's root directory:
+
+    python benchmarks/numeric.py
+"""
+from __future__ import print_function, unicode_literals
+import io
+import itertools
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pyqrcode import builder
+
+DIGITS = '1234567890' * 708 + '123456789'
+
+
+def old_encode_numeric(data):
+    """The string based encoder the packed encoder replaced."""
+    def grouper(n, iterable):
+        args = [iter(iterable)] * n
+        if hasattr(itertools, 'zip_longest'):
+            return itertools.zip_longest(*args)
+        return itertools.izip_longest(*args)
+
+    with io.StringIO() as buf:
+        for triplet in grouper(3, data):
+            number = ''
+            for digit in triplet:
+                if isinstance(digit, int):
+                    digit = chr(digit)
+                if digit:
+                    number = ''.join([number, digit])
+                else:
+                    break
+            length = {1: 4, 2: 7}.get(len(number), 10)
+            buf.write('{{0:0{0}b}}'.format(length).format(int(number)))
+        return buf.getvalue()
+
+
+class Encoder(builder.QRCodeBuilder):
+    """A builder that only holds a buffer, it does not build a code."""
+    def __init__(self):
+        self.buffer = builder.BitBuffer()
+
+
+def new_encode_numeric(data):
+    """Encodes the data with the builder's numeric encoder."""
+    encoder = Encoder()
+    encoder.encode_numeric(data)
+    return encoder.buffer
+
+
+def bench(label, func, *args):
+    runs = 50
+    best = min(timeit.repeat(lambda: func(*args), number=runs, repeat=5))
+    print('{0:<32} {1:8.3f} ms'.format(label, best / runs * 1000))
+
+
+if __name__ == '__main__':
+    assert old_encode_numeric(DIGITS) == \
+           new_encode_numeric(DIGITS).getvalue()
+
+    number = int(DIGITS[:4000]) * 10 ** 3089 + int(DIGITS[4000:])
+    print('Encoding {0} digits'.format(len(DIGITS)))
+    bench('old encoder, digit string', old_encode_numeric, DIGITS)
+    bench('new encoder, digit string', new_encode_numeric, DIGITS)
+    bench('new encoder, digit bytes', new_encode_numeric,
+          DIGITS.encode('ascii'))
+    bench('new encoder, integer', new_encode_numeric, number)
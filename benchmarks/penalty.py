@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""\
+Checks and benchmarks the mask penalty scoring.
+
+The old scoring looped over every module of every mask in Python, rule 3
+tried both 11 module patterns in both directions at every module. It is
+copied below. Every rule's score is checked against it for the eight masks
+of a code of each version from 1 to 40, with the bitboard scoring and,
+when it is installed, with NumPy. The bounded scoring, which stops scoring
+a mask once it cannot win, must pick the same mask. Then they are all
+timed on a few versions. Run this from the project's root directory:
+
+    python benchmarks/penalty.py
+"""
+from __future__ import division, print_function, unicode_literals
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pyqrcode import builder, reedsolomon, tables
+
+ERRORS = 'LMQH'
+TIMED_VERSIONS = (1, 10, 25, 40)
+
+
+def old_scores(masks):
+    """The loop based scoring the bitboard scoring replaced."""
+    scores = []
+    for n in range(len(masks)):
+        scores.append([0, 0, 0, 0])
+
+    for (n, mask) in enumerate(masks):
+        current = mask[0][0]
+        counter = 0
+        total = 0
+        for row in range(0, len(mask)):
+            counter = 0
+            for col in range(0, len(mask)):
+                bit = mask[row][col]
+                if bit == current:
+                    counter += 1
+                else:
+                    if counter >= 5:
+                        total += (counter - 5) + 3
+                    counter = 1
+                    current = bit
+            if counter >= 5:
+                total += (counter - 5) + 3
+        for col in range(0, len(mask)):
+            counter = 0
+            for row in range(0, len(mask)):
+                bit = mask[row][col]
+                if bit == current:
+                    counter += 1
+                else:
+                    if counter >= 5:
+                        total += (counter - 5) + 3
+                    counter = 1
+                    current = bit
+            if counter >= 5:
+                total += (counter - 5) + 3
+        scores[n][0] = total
+
+    for (n, mask) in enumerate(masks):
+        count = 0
+        for i in range(0, len(mask)-1):
+            for j in range(0, len(mask)-1):
+                if mask[i][j] == mask[i+1][j] and \
+                   mask[i][j] == mask[i][j+1] and \
+                   mask[i][j] == mask[i+1][j+1]:
+                    count += 1
+        scores[n][1] = count * 3
+
+    patterns = [[0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+                [1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0]]
+    for (n, mask) in enumerate(masks):
+        nmatches = 0
+        for i in range(len(mask)):
+            for j in range(len(mask)):
+                for pattern in patterns:
+                    match = True
+                    k = j
+                    for p in pattern:
+                        if k >= len(mask) or mask[i][k] != p:
+                            match = False
+                            break
+                        k += 1
+                    if match:
+                        nmatches += 1
+                    match = True
+                    k = j
+                    for p in pattern:
+                        if k >= len(mask) or mask[k][i] != p:
+                            match = False
+                            break
+                        k += 1
+                    if match:
+                        nmatches += 1
+        scores[n][2] = nmatches * 40
+
+    for (n, mask) in enumerate(masks):
+        nblack = 0
+        for row in mask:
+            nblack += sum(row)
+        total_pixels = len(mask)**2
+        ratio = nblack / total_pixels
+        percent = (ratio * 100) - 50
+        scores[n][3] = int((abs(int(percent)) / 5) * 10)
+    return scores
+
+
+def make_builder(version, error):
+    """Returns a builder, with its masks, for a random full code."""
+    capacity = tables.data_capacity[version][error][tables.modes['binary']]
+    data = bytes(bytearray(random.randrange(256) for _ in range(capacity)))
+    return builder.QRCodeBuilder(data, version, 'binary', error,
+                                 keep_masks=True)
+
+
+if __name__ == '__main__':
+    backends = ['python']
+    if reedsolomon._import_numpy() is not None:
+        backends.append('numpy')
+
+    random.seed(0)
+    skipped = dict((name, 0) for name in backends)
+    for version in range(1, 41):
+        qr = make_builder(version, ERRORS[version % 4])
+        expected = old_scores(qr.masks)
+        totals = [sum(scores) for scores in expected]
+        for name in backends:
+            builder.set_scoring_backend(name)
+            qr.keep_masks = True
+            qr.choose_best_mask()
+            assert expected == qr.scores, (version, name)
+            qr.keep_masks = False
+            assert totals.index(min(totals)) == qr.choose_best_mask(), \
+                   (version, name)
+            skipped[name] += qr.skipped_rules
+    print('The scores of versions 1 to 40 match the old scoring, using {0}'
+          .format(' and '.join(backends)))
+    for name in backends:
+        print('  {0:<12} bounded scoring skipped {1} of {2} rules'
+              .format(name, skipped[name], 40 * 32))
+
+    for version in TIMED_VERSIONS:
+        qr = make_builder(version, 'M')
+        print('Version {0}, eight masks'.format(version))
+        best = min(timeit.repeat(lambda: old_scores(qr.masks), number=1,
+                                 repeat=3))
+        print('  {0:<18} {1:10.2f} ms'.format('old scoring', best * 1000))
+        for name in backends:
+            builder.set_scoring_backend(name)
+            for keep_masks, label in ((True, name), (False, name + ' bound')):
+                qr.keep_masks = keep_masks
+                best = min(timeit.repeat(qr.choose_best_mask, number=20,
+                                         repeat=3)) / 20
+                print('  {0:<18} {1:10.2f} ms'.format(label, best * 1000))
+    builder.set_scoring_backend('auto')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""\
+Benchmarks the Reed-Solomon encoder on the block shapes of a few versions,
+then encodes a batch of codes of the same version one block at a time and
+with a single call to reedsolomon.encode_codes(), using each backend that
+is available and with the block shapes compiled ahead of time.
+
+The old encoder copied the block, popped its first coefficient for every
+code word and worked out every product through the log and antilog tables
+with a modulo. It is copied below so the two can be compared. Run this
+from the project's root directory:
+
+    python benchmarks/reedsolomon.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pyqrcode import reedsolomon, tables
+
+#: (version, error level) pairs to benchmark, small to large blocks
+SHAPES = ((1, 'L'), (5, 'Q'), (10, 'M'), (20, 'H'), (40, 'L'))
+
+
+def old_error_block(block, error_block_size):
+    """The list based encoder the register based encoder replaced."""
+    mp_co = block[:]
+    mp_co.extend([0] * (error_block_size))
+    generator = tables.generator_polynomials[error_block_size]
+    gen_result = [0] * len(generator)
+    for i in range(len(block)):
+        coefficient = mp_co.pop(0)
+        if coefficient == 0:
+            continue
+        else:
+            alpha_exp = tables.galois_antilog[coefficient]
+        for n in range(len(generator)):
+            gen_result[n] = alpha_exp + generator[n]
+            if gen_result[n] > 255:
+                gen_result[n] = gen_result[n] % 255
+            gen_result[n] = tables.galois_log[gen_result[n]]
+            mp_co[n] = gen_result[n] ^ mp_co[n]
+    return mp_co
+
+
+def bench(label, func, *args):
+    runs = 2000
+    best = min(timeit.repeat(lambda: func(*args), number=runs, repeat=5))
+    per_block = best / runs * 1e6
+    print('  {0:<12} {1:8.2f} us/block {2:10.0f} blocks/s'
+          .format(label, per_block, 1e6 / per_block))
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    for version, error in SHAPES:
+        ecc_length, _, data_length = tables.eccwbi[version][error][:3]
+        block = bytearray(random.randrange(256) for _ in range(data_length))
+        assert old_error_block(bytearray(block), ecc_length) == \
+               reedsolomon.encode(block, ecc_length)
+
+        print('Version {0}-{1}: {2} data and {3} error code words'
+              .format(version, error, data_length, ecc_length))
+        bench('old encoder', old_error_block, bytearray(block), ecc_length)
+        bench('register', reedsolomon.encode, block, ecc_length)
+        reedsolomon.compile_shape(data_length, ecc_length)
+        bench('compiled', reedsolomon.encode, block, ecc_length)
+
+    version, error, count = 10, 'M', 1000
+    total = tables.data_capacity[version][error][0] // 8
+    codes = [bytearray(random.randrange(256) for _ in range(total))
+             for _ in range(count)]
+    ecc_length = tables.eccwbi[version][error][0]
+
+    def one_at_a_time():
+        return [[reedsolomon.encode(block, ecc_length) for block in
+                 reedsolomon._split_blocks(code, version, error)]
+                for code in codes]
+
+    def batched():
+        return reedsolomon.encode_codes(codes, version, error)
+
+    backends = ['python']
+    if reedsolomon._import_numpy() is not None:
+        backends.append('numpy')
+
+    reedsolomon._shape_tables.clear()
+    del reedsolomon._shape_order[:]
+    expected = one_at_a_time()
+    print('{0} version {1}-{2} codes'.format(count, version, error))
+    best = min(timeit.repeat(one_at_a_time, number=5, repeat=3)) / 5
+    print('  {0:<28} {1:8.2f} ms {2:10.0f} codes/s'
+          .format('one block at a time', best * 1000, count / best))
+    for name in backends:
+        reedsolomon.set_backend(name)
+        assert expected == [ecc for blocks, ecc in batched()]
+        best = min(timeit.repeat(batched, number=5, repeat=3)) / 5
+        print('  {0:<28} {1:8.2f} ms {2:10.0f} codes/s'
+              .format('encode_codes(), ' + name, best * 1000, count / best))
+
+    reedsolomon.set_backend('python')
+    reedsolomon.compile_shape(tables.eccwbi[version][error][2], ecc_length)
+    reedsolomon.compile_shape(tables.eccwbi[version][error][4], ecc_length)
+    assert expected == [ecc for blocks, ecc in batched()]
+    best = min(timeit.repeat(batched, number=5, repeat=3)) / 5
+    print('  {0:<28} {1:8.2f} ms {2:10.0f} codes/s'
+          .format('encode_codes(), compiled', best * 1000, count / best))
+    reedsolomon.set_backend('auto')
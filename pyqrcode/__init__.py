@@ -45,13 +45,25 @@ from __future__ import absolute_import, division, print_function, with_statement
 
 import pyqrcode.tables
 import pyqrcode.builder as builder
+import numbers
 
 try:
     str = unicode  # Python 2
 except NameError:
     pass
 
-def create(content, error='H', version=None, mode=None, encoding=None):
+def _content_to_str(content):
+    """Converts content that is not a string or bytes into a string.
+    Integers are converted using builder._int_to_digits() so that numbers
+    of any length can be used, everything else uses str().
+    """
+    if isinstance(content, numbers.Integral) and \
+       not isinstance(content, bool):
+        return builder._int_to_digits(content)
+    return str(content)  # str == unicode in Py 2.x, see file head
+
+def create(content, error='H', version=None, mode=None, encoding=None,
+           keep_masks=False, mask='auto'):
     """When creating a QR code only the content to be encoded is required,
     all the other properties of the code will be guessed based on the
     contents given. This function will return a :class:`QRCode` object.
@@ -101,74 +113,186 @@ def create(content, error='H', version=None, mode=None, encoding=None):
     used for Japanese characters, but only those that can be understood
     via the shift-jis string encoding. Finally, we then have 'binary' mode
     which just encodes the bytes directly into the QR code (this encoding
-    is the least efficient).
+    is the least efficient). There is also a special 'mixed' mode. It splits
+    the content into several segments, each using the most efficient mode
+    for its characters, such that the encoded data is as small as possible.
+    For example, a URL ending in a long numeric ID will store the ID using
+    the numeric mode.
 
     The *encoding* parameter specifies how the content will be interpreted.
     This parameter only matters if the *content* is a string, unicode, or
     byte array type. This parameter must be a valid encoding string or None. 
     t will be passed the *content*'s encode/decode methods.
-    """
-    return QRCode(content, error, version, mode, encoding)
-
-class QRCode:
-    """This class represents a QR code. To use this class simply give the
-    constructor a string representing the data to be encoded, it will then
-    build a code in memory. You can then save it in various formats. Note,
-    codes can be written out as PNG files but this requires the PyPNG module.
-    You can find the PyPNG module at http://packages.python.org/pypng/.
 
-    Examples:
-        >>> from pyqrcode import QRCode
-        >>> import sys
-        >>> url = QRCode('http://uca.edu')
-        >>> url.svg(sys.stdout, scale=1)
-        >>> url.svg('uca.svg', scale=4)
-        >>> number = QRCode(123456789012345)
-        >>> number.png('big-number.png')
+    The *mask* parameter sets how the code's mask pattern is chosen. The
+    standard defines eight patterns, the code is built with each of them
+    and the one with the lowest penalty score, i.e. the one that should be
+    easiest to scan, is used. This is what the default, 'auto', does. The
+    'fast' policy scores the patterns with a cheaper approximation of the
+    penalty rules, the chosen pattern may not be the standard's choice. A
+    number from 0 to 7 always uses that pattern, the other seven are not
+    built at all. Any pattern can be read by a scanner, so 'fast' or a
+    fixed pattern are useful when speed matters more than how easily the
+    code is scanned. The pattern that was used is kept in the code's
+    *mask* attribute.
+
+    The *keep_masks* parameter is meant for debugging. The code is built
+    eight times, once with each of the standard's mask patterns, and the
+    one that is easiest to scan is kept. The other seven are thrown away
+    unless this parameter is True, then they are kept in the code's
+    builder as *masks*, along with their penalty *scores*.
+    """
+    return QRCode(content, error, version, mode, encoding,
+                  keep_masks=keep_masks, mask=mask)
+
+def estimate(content, error='H', version=None, mode=None, encoding=None,
+             scale=1, quiet_zone=4):
+    """This function works out the size of the QR code that
+    :func:`pyqrcode.create` would make for the given *content*, without
+    building the code. The mode and version are chosen exactly as they
+    are when the code is created, but no error correction, masking or
+    penalty scoring is done. This makes it much cheaper than creating
+    the code.
+
+    The *content*, *error*, *version*, *mode*, and *encoding* parameters
+    are the same as those of :func:`pyqrcode.create`. The *scale* and
+    *quiet_zone* parameters are the same as those of
+    :py:meth:`QRCode.get_png_size`. A ValueError is raised for content
+    that cannot be encoded, just like :func:`pyqrcode.create` does.
+
+    This function returns a dictionary with the following keys. The
+    'version', 'mode', and 'error' keys hold the properties the code
+    would have. The 'bits' key holds the exact number of bits needed to
+    encode the content, including the mode indicators and data length
+    fields, but not the terminator or padding. The 'modules' key holds
+    the number of modules along one side of the code, without the quiet
+    zone. Finally, the 'size' key holds the width and height, in pixels,
+    of the code drawn with the given *scale* and *quiet_zone*.
+
+    Example:
+        >>> info = pyqrcode.estimate('http://uca.edu')
+        >>> print(info['version'], info['modules'], info['size'])
+        2 25 33
+    """
+    return _Estimate(content, error, version, mode, encoding) \
+               .info(scale, quiet_zone)
+
+def create_sequence(content, error='H', max_version=40, mode=None,
+                    encoding=None):
+    """This function splits *content* that is too large for a single code,
+    or for a code no larger than *max_version*, across a structured append
+    sequence of up to 16 codes. It returns a list of :class:`QRCode`
+    objects, in order. Scanners that support structured append read the
+    codes in any order and join their data back together.
+
+    Each code starts with a header that holds its position in the
+    sequence, the number of codes, and the parity of the complete data.
+    The data is split into pieces of the same size, so the codes will
+    all have about the same version. Each code is built on its own and
+    uses the smallest version its piece fits in.
+
+    The *content*, *error*, *mode*, and *encoding* parameters are the
+    same as those of :func:`pyqrcode.create`. The *max_version* parameter
+    sets the largest version any of the codes may have. A ValueError is
+    raised if the content does not fit in 16 codes of that version.
+
+    Example:
+        >>> codes = pyqrcode.create_sequence('A' * 1000, max_version=10)
+        >>> for n, code in enumerate(codes):
+        ...     code.svg('part-{0}.svg'.format(n), scale=4)
+    """
+    return _Sequence(content, error, max_version, mode, encoding).codes()
 
-    .. note::
-        For what all of the parameters do, see the :func:`pyqrcode.create`
-        function.
+class _Content:
+    """This class works out the mode, data, error level and version of a
+    QR code from its content, without building the code. It is shared by
+    :class:`QRCode` and the helpers behind :func:`pyqrcode.estimate` and
+    :func:`pyqrcode.create_sequence`.
     """
-    def __init__(self, content, error='H', version=None, mode=None,
-                 encoding='iso-8859-1'):
-        #Guess the mode of the code, this will also be used for
-        #error checking
-        guessed_content_type, encoding = self._detect_content_type(content, encoding)
-        
-        if encoding is None:
-            encoding = 'iso-8859-1'
+    def _init_content(self, content, error, version, mode, encoding,
+                      sequence=None):
+        """This method sets up the data, encoding, mode, error level and
+        version of the code. Nothing is built, this only checks the
+        parameters against the *content*.
+        """
+        self._init_data(content, mode, encoding)
+        self._init_version(error, version, sequence)
 
-        #Store the encoding for use later
-        if guessed_content_type == 'kanji':
-            self.encoding = 'shiftjis'
+    def _init_version(self, error, version, sequence=None):
+        """This method sets up the error level and version of the code, once
+        its data and mode are known.
+        """
+        self._init_error(error)
+
+        #Symbols of a structured append sequence need room for the header
+        self.sequence = sequence
+        if sequence is None:
+            self._header_bits = 0
         else:
-            self.encoding = encoding
-        
-        if version is not None:
-            if 1 <= version <= 40:
-                self.version = version
-            else:
-                raise ValueError("Illegal version {0}, version must be between "
-                                 "1 and 40.".format(version))
+            self._header_bits = builder._structured_append_bits
 
-        #Decode a 'byte array' contents into a string format
-        if isinstance(content, bytes):
-            self.data = content.decode(encoding)
+        if version is not None and not 1 <= version <= 40:
+            raise ValueError("Illegal version {0}, version must be between "
+                             "1 and 40.".format(version))
 
-        #Give a string an encoding
-        elif hasattr(content, 'encode'):
-            self.data = content.encode(self.encoding)
+        #Guess the "best" version
+        self.version = self._pick_best_fit(self.data)
 
-        #The contents are not a byte array or string, so
-        #try naively converting to a string representation.
-        else:
-            self.data = str(content)  # str == unicode in Py 2.x, see file head
+        #If the user supplied a version, then check that it has
+        #sufficient data capacity for the contents passed in
+        if version:
+            if version >= self.version and \
+               builder._segments_fit(self._segments_for(self.data)(version),
+                                     version, self.error, self._header_bits):
+                self.version = version
+            else:
+                raise ValueError('The data will not fit inside a version {} '
+                                 'code with the given encoding and error '
+                                 'level (the code must be at least a '
+                                 'version {}).'.format(version, self.version))
 
+    def _init_data(self, content, mode, encoding):
+        """This method sets up the data, encoding and mode of the code."""
         #Force a passed in mode to be lowercase
         if hasattr(mode, 'lower'):
             mode = mode.lower()
 
+        #Mixed mode codes split the content into segments, each one using
+        #the best mode for its characters, see builder._segment().
+        if mode == 'mixed':
+            self.mode = mode
+            self.mode_num = None
+            self.encoding = encoding if encoding else 'iso-8859-1'
+            self._segment_cache = {}
+            if isinstance(content, builder._bytes_types):
+                self.data = builder._byte_view(content)
+            elif hasattr(content, 'encode'):
+                self.data = content
+            else:
+                self.data = _content_to_str(content)
+        else:
+            self._init_single_mode(content, mode, encoding)
+
+    def _init_error(self, error):
+        """This method checks and sets the error level of the code."""
+        #Check that the user passed in a valid error level
+        if error in tables.error_level.keys():
+            self.error = tables.error_level[error]
+        else:
+            raise ValueError('{0} is not a valid error '
+                             'level.'.format(error))
+
+    def _init_single_mode(self, content, mode, encoding):
+        """This method sets up the data, encoding and mode of a code that
+        uses a single mode for all of its content. The *mode* is checked
+        against the content.
+        """
+        #Guess the mode of the code, this will also be used for error
+        #checking. The content comes back encoded for the guessed mode,
+        #except for raw bytes forced into the binary mode, which are kept.
+        guessed_content_type, self.encoding, self.data = \
+            builder._classify(content, encoding, mode)
+
         #Check that the mode parameter is compatible with the contents
         if mode is None:
             #Use the guessed mode
@@ -197,34 +321,101 @@ class QRCode:
             self.mode = mode
             self.mode_num = tables.modes[self.mode]
 
-        #Check that the user passed in a valid error level
-        if error in tables.error_level.keys():
-            self.error = tables.error_level[error]
-        else:
-            raise ValueError('{0} is not a valid error '
-                             'level.'.format(error))
+    def _segments(self, version):
+        """Returns the mixed mode segments of this code's data for the given
+        *version*. The segments only depend on the length of the data length
+        fields, so they are computed once for each of the three version
+        ranges.
+        """
+        length_class = builder._length_class(version)
+        if length_class not in self._segment_cache:
+            self._segment_cache[length_class] = \
+                builder._segment(self.data, version, self.encoding)
+        return self._segment_cache[length_class]
 
-        #Guess the "best" version
-        self.version = self._pick_best_fit(self.data)
+    def _pick_best_fit(self, content):
+        """This method return the smallest possible QR code version number
+        that will fit the specified data with the given error level. The
+        exact number of bits needed, including the mode indicator and data
+        length field, is compared to the capacity of each version, see
+        builder._pick_version().
+        """
+        data = content if self.mode == 'mixed' else None
+        version = builder._pick_version(self._segments_for(content),
+                                        self.error, self._header_bits, data)
+        if version is None:
+            raise ValueError('The data will not fit in any QR code version '
+                             'with the given encoding and error level.')
+        return version
+
+    def _segments_for(self, content):
+        """Returns a function that takes a version and returns the
+        (mode number, data) segments of the *content* for that version.
+        """
+        if self.mode == 'mixed':
+            return self._segments
+        segments = [(self.mode_num, content)]
+        return lambda version: segments
 
-        #If the user supplied a version, then check that it has
-        #sufficient data capacity for the contents passed in
-        if version:
-            if version >= self.version:
-                self.version = version
-            else:
-                raise ValueError('The data will not fit inside a version {} '
-                                 'code with the given encoding and error '
-                                 'level (the code must be at least a '
-                                 'version {}).'.format(version, self.version))
+
+class QRCode(_Content):
+    """This class represents a QR code. To use this class simply give the
+    constructor a string representing the data to be encoded, it will then
+    build a code in memory. You can then save it in various formats. Note,
+    codes can be written out as PNG files but this requires the PyPNG module.
+    You can find the PyPNG module at http://packages.python.org/pypng/.
+
+    Examples:
+        >>> from pyqrcode import QRCode
+        >>> import sys
+        >>> url = QRCode('http://uca.edu')
+        >>> url.svg(sys.stdout, scale=1)
+        >>> url.svg('uca.svg', scale=4)
+        >>> number = QRCode(123456789012345)
+        >>> number.png('big-number.png')
+
+    .. note::
+        For what all of the parameters do, see the :func:`pyqrcode.create`
+        function. The *sequence* parameter makes the code a symbol of a
+        structured append sequence, see :func:`pyqrcode.create_sequence`.
+        It is a (position, number of symbols, parity) tuple. The position
+        counts from 0, there are at most 16 symbols and the parity is a
+        value from 0 to 255, otherwise a ValueError is raised.
+    """
+    def __init__(self, content, error='H', version=None, mode=None,
+                 encoding='iso-8859-1', sequence=None, keep_masks=False,
+                 mask='auto'):
+        #Work out the mode, data and version of the code
+        self._init_content(content, error, version, mode, encoding,
+                           sequence)
+        self._build(keep_masks, mask)
+
+    def _build(self, keep_masks=False, mask='auto'):
+        """This method builds the code from its data, mode, version and
+        error level.
+        """
+        #Mixed codes hand the builder the segments, which depend on the
+        #version's data length fields
+        if self.mode == 'mixed':
+            data = self._segments(self.version)
+        else:
+            data = self.data
 
         #Build the QR code
-        self.builder = builder.QRCodeBuilder(data=self.data,
+        self.builder = builder.QRCodeBuilder(data=data,
                                              version=self.version,
                                              mode=self.mode,
-                                             error=self.error)
+                                             error=self.error,
+                                             sequence=self.sequence,
+                                             keep_masks=keep_masks,
+                                             mask=mask)
 
-        #Save the code for easier reference
+        #The number of the mask pattern that was used
+        self.mask = self.builder.best_mask
+
+        #Save the code for easier reference, it is a list of rows and every
+        #row is a bytearray holding a 0 or a 1 for each module, see
+        #builder._Row
         self.code = self.builder.code
 
     def __str__(self):
@@ -237,119 +428,6 @@ class QRCode:
         return "QRCode(content={0}, error='{1}', version={2}, mode='{3}')" \
                 .format(repr(self.data), self.error, self.version, self.mode)
 
-    def _detect_content_type(self, content, encoding):
-        """This method tries to auto-detect the type of the data. It first
-        tries to see if the data is a valid integer, in which case it returns
-        numeric. Next, it tests the data to see if it is 'alphanumeric.' QR
-        Codes use a special table with very limited range of ASCII characters.
-        The code's data is tested to make sure it fits inside this limited
-        range. If all else fails, the data is determined to be of type
-        'binary.'
-        
-        Returns a tuple containing the detected mode and encoding.
-
-        Note, encoding ECI is not yet implemented.
-        """
-        def two_bytes(c):
-            """Output two byte character code as a single integer."""
-            def next_byte(b):
-                """Make sure that character code is an int. Python 2 and
-                3 compatibility.
-                """
-                if not isinstance(b, int):
-                    return ord(b)
-                else:
-                    return b
-
-            #Go through the data by looping to every other character
-            for i in range(0, len(c), 2):
-                yield (next_byte(c[i]) << 8) | next_byte(c[i+1])
-
-        #See if the data is a number
-        try:
-            if str(content).isdigit():
-                return 'numeric', encoding
-        except (TypeError, UnicodeError):
-            pass
-
-        #See if that data is alphanumeric based on the standards
-        #special ASCII table
-        valid_characters = ''.join(tables.ascii_codes.keys())
-        
-        #Force the characters into a byte array
-        valid_characters = valid_characters.encode('ASCII')
-
-        try:
-            if isinstance(content, bytes):
-                c = content.decode('ASCII')
-            else:
-                c = str(content).encode('ASCII')
-
-            if all(map(lambda x: x in valid_characters, c)):
-                return 'alphanumeric', 'ASCII'
-
-        #This occurs if the content does not contain ASCII characters.
-        #Since the whole point of the if statement is to look for ASCII
-        #characters, the resulting mode should not be alphanumeric.
-        #Hence, this is not an error.
-        except TypeError:
-            pass
-        except UnicodeError:
-            pass
-
-        try:
-            if isinstance(content, bytes):
-                if encoding is None:
-                    encoding = 'shiftjis'
-
-                c = content.decode(encoding).encode('shiftjis')
-            else:
-                c = content.encode('shiftjis')
-            
-            #All kanji characters must be two bytes long, make sure the
-            #string length is not odd.
-            if len(c) % 2 != 0:
-                return 'binary', encoding
-
-            #Make sure the characters are actually in range.
-            for asint in two_bytes(c):
-                #Shift the two byte value as indicated by the standard
-                if not (0x8140 <= asint <= 0x9FFC or
-                        0xE040 <= asint <= 0xEBBF):
-                    return 'binary', encoding
-
-            return 'kanji', encoding
-
-        except UnicodeError:
-            #This occurs if the content does not contain Shift JIS kanji
-            #characters. Hence, the resulting mode should not be kanji.
-            #This is not an error.
-            pass
-
-        #All of the other attempts failed. The content can only be binary.
-        return 'binary', encoding
-
-    def _pick_best_fit(self, content):
-        """This method return the smallest possible QR code version number
-        that will fit the specified data with the given error level.
-        """
-        import math
-        
-        for version in range(1, 41):
-            #Get the maximum possible capacity
-            capacity = tables.data_capacity[version][self.error][self.mode_num]
-            
-            #Check the capacity
-            #Kanji's count in the table is "characters" which are two bytes
-            if (self.mode_num == tables.modes['kanji'] and
-                capacity >= math.ceil(len(content) / 2)):
-                return version
-            if capacity >= len(content):
-                return version
-
-        raise ValueError('The data will not fit in any QR code version '
-                         'with the given encoding and error level.')
-
     def show(self, wait=1.2, scale=10, module_color=(0, 0, 0, 255),
             background=(255, 255, 255, 255), quiet_zone=4):
         """Displays this QR code.
@@ -689,3 +767,103 @@ class QRCode:
         """
         return builder._text(self.code, quiet_zone)
 
+
+class _Estimate(_Content):
+    """This class holds the mode, data and version of a QR code without
+    building the code. It is used by :func:`pyqrcode.estimate`.
+    """
+    def __init__(self, content, error='H', version=None, mode=None,
+                 encoding='iso-8859-1'):
+        self._init_content(content, error, version, mode, encoding)
+
+    def info(self, scale=1, quiet_zone=4):
+        """Returns the dictionary described in :func:`pyqrcode.estimate`."""
+        if self.mode == 'mixed':
+            segments = self._segments(self.version)
+        else:
+            segments = [(self.mode_num, self.data)]
+
+        return {'version': self.version,
+                'mode': self.mode,
+                'error': self.error,
+                'bits': builder._segments_length(segments, self.version) +
+                        self._header_bits,
+                'modules': tables.version_size[self.version],
+                'size': builder._get_png_size(self.version, scale,
+                                              quiet_zone)}
+
+
+class _Sequence(_Content):
+    """This class splits content across the codes of a structured append
+    sequence. It is used by :func:`pyqrcode.create_sequence`.
+    """
+    def __init__(self, content, error='H', max_version=40, mode=None,
+                 encoding='iso-8859-1'):
+        self._init_data(content, mode, encoding)
+        self._init_error(error)
+
+        if not 1 <= max_version <= 40:
+            raise ValueError("Illegal version {0}, version must be between "
+                             "1 and 40.".format(max_version))
+        self.max_version = max_version
+
+    def _piece_segments(self, piece):
+        """Returns the segments of a *piece* of the data in a code of the
+        largest allowed version.
+        """
+        if self.mode == 'mixed':
+            return builder._segment(piece, self.max_version, self.encoding)
+        return [(self.mode_num, piece)]
+
+    def _split(self, count):
+        """Splits the data into at most *count* pieces of the same size.
+        Kanji characters are never split in half.
+        """
+        unit = 2 if self.mode == 'kanji' else 1
+        size = -(-len(self.data) // (count * unit)) * unit
+        if size == 0:
+            return [self.data]
+        return [self.data[i:i+size] for i in range(0, len(self.data), size)]
+
+    def codes(self):
+        """Returns the list of codes that hold the data."""
+        whole = self._piece_segments(self.data)
+        parity = builder._parity(data for mode, data in whole)
+
+        #Each code can hold at most this many bits of data, use it to
+        #skip counts of codes that are certain to be too small
+        capacity = builder._bit_capacities[self.error][self.max_version - 1]
+        capacity -= builder._structured_append_bits
+        bits = builder._segments_length(whole, self.max_version)
+        first = max(1, -(-bits // capacity))
+
+        for count in range(first, 17):
+            pieces = self._split(count)
+            if all(builder._segments_fit(self._piece_segments(piece),
+                                         self.max_version, self.error,
+                                         builder._structured_append_bits)
+                   for piece in pieces):
+                break
+        else:
+            raise ValueError('The data will not fit in 16 version {0} '
+                             'codes with the given encoding and error '
+                             'level.'.format(self.max_version))
+
+        return [_Symbol(self, piece, (n, len(pieces), parity))
+                for n, piece in enumerate(pieces)]
+
+
+class _Symbol(QRCode):
+    """This class builds one code of a structured append sequence. The
+    *piece* of data was already encoded for the *sequence*'s mode, so it
+    is used as it is instead of being classified again.
+    """
+    def __init__(self, sequence, piece, header):
+        self.data = piece
+        self.mode = sequence.mode
+        self.mode_num = sequence.mode_num
+        self.encoding = sequence.encoding
+        if self.mode == 'mixed':
+            self._segment_cache = {}
+        self._init_version(sequence.error, None, header)
+        self._build()
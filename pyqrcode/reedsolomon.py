@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Michael Nooner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the names of its 
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""This module computes the Reed-Solomon error correction code words of a
+QR code's data blocks. It is meant to be used internally by the builder.
+
+The arithmetic is done in GF(256) using the tables in :py:mod:`tables`.
+The generator polynomials are converted from alpha exponents into
+coefficients once. The division is done with a remainder register, like a
+hardware LFSR, instead of shifting a list of coefficients.
+
+Because the encoding is linear, the error correction code words of a
+block are also the exclusive or of one precomputed vector for each of its
+data bytes. Block shapes can be compiled into such tables ahead of time,
+see compile_shape().
+
+When NumPy is installed, large batches of codes are encoded with NumPy
+instead, all the blocks of the same length at once. See set_backend().
+"""
+
+#Imports required for 2.x support
+from __future__ import absolute_import, division, print_function, with_statement, unicode_literals
+
+import pyqrcode.tables as tables
+import binascii
+from functools import reduce
+import operator
+
+#: NumPy is only imported when it is first needed, see _import_numpy().
+#: Importing it takes several times longer than importing pyqrcode.
+numpy = None
+_numpy_missing = False
+
+def _import_numpy():
+    """Returns the numpy module, importing it the first time this is
+    called, or None if NumPy is not installed.
+    """
+    global numpy, _numpy_missing
+    if numpy is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            _numpy_missing = True
+    return numpy
+
+#: The backend used by encode_blocks(), see set_backend().
+backend = 'auto'
+
+#: In the 'auto' backend, encode_codes() uses NumPy for batches of several
+#: codes with at least this many blocks in all. Smaller batches are faster
+#: in pure Python. A single code never uses NumPy, since importing it
+#: takes longer than building the code.
+numpy_min_blocks = 64
+
+def set_backend(name):
+    """Selects how encode_blocks() does its arithmetic. The *name* is
+    'python' to always use pure Python, 'numpy' to always use NumPy, or
+    'auto' (the default) to use NumPy for large batches of codes passed
+    to encode_codes() when it is installed. A ValueError is raised for
+    any other name, or for 'numpy' if NumPy is not installed.
+    """
+    global backend
+    if name not in ('auto', 'numpy', 'python'):
+        raise ValueError('{0} is not a valid backend, use "auto", "numpy" '
+                         'or "python".'.format(name))
+    if name == 'numpy' and _import_numpy() is None:
+        raise ValueError('The numpy backend requires NumPy to be '
+                         'installed.')
+    backend = name
+
+#: Powers of alpha, doubled in length so that the sum of two logarithms
+#: can be looked up without taking it modulo 255.
+exp = bytearray(tables.galois_log[:255] * 2)
+
+#: The logarithm of every non-zero element of GF(256). The logarithm of
+#: zero is undefined, it is stored as 0 but must never be looked up.
+log = bytearray([0] + tables.galois_antilog[1:])
+
+def multiply(a, b):
+    """Returns the product of *a* and *b* in GF(256)."""
+    if a == 0 or b == 0:
+        return 0
+    return exp[log[a] + log[b]]
+
+def generator(ecc_length):
+    """Returns the coefficients of the generator polynomial used to make
+    *ecc_length* error correction code words, without its leading 1. The
+    polynomial comes from tables.generator_polynomials, where it is kept
+    as powers of alpha.
+    """
+    return bytearray(exp[power]
+                     for power in tables.generator_polynomials[ecc_length])
+
+#: The feedback tables made by _feedback_table(), keyed by the number of
+#: error correction code words.
+_feedback_tables = {}
+
+def _feedback_table(ecc_length):
+    """Returns a list that holds, for every byte value, the generator
+    polynomial multiplied by that byte. Each product is packed into a
+    single integer, one byte per coefficient with the highest power in
+    the most significant byte, so that it can be applied to the remainder
+    register with one exclusive or.
+    """
+    if ecc_length not in _feedback_tables:
+        coefficients = generator(ecc_length)
+        table = [0]
+        for value in range(1, 256):
+            product = bytearray(multiply(value, c) for c in coefficients)
+            table.append(int(binascii.hexlify(product), 16))
+        _feedback_tables[ecc_length] = table
+    return _feedback_tables[ecc_length]
+
+#: The most block shapes whose compiled tables are kept at once. When
+#: another shape is compiled, the least recently used one is dropped.
+max_shapes = 8
+
+#: If set, a block shape is compiled once this many of its blocks have
+#: been encoded. Compiling costs about as much as encoding 300 blocks. It
+#: is None by default, so shapes are only compiled by compile_shape().
+compile_after = None
+
+#: The tables made by compile_shape(), keyed by (data length, ecc length)
+_shape_tables = {}
+
+#: The keys of _shape_tables, ordered from least to most recently used
+_shape_order = []
+
+#: The number of blocks encoded for each shape that is not compiled.
+_shape_counts = {}
+
+def compile_shape(data_length, ecc_length):
+    """Returns the compiled tables for blocks of *data_length* code words
+    with *ecc_length* error correction code words, building them if they
+    are not cached. Call it ahead of time to skip the warm up when many
+    codes of the same version and error level will be made.
+
+    The tables are a list holding, for each data position, the remainder
+    of every byte value at that position, packed like the feedback table.
+    The error correction code words of a block are the exclusive or of
+    one entry per data byte. At most max_shapes shapes are cached.
+
+    The tables are large for a small gain. The largest shape, version
+    40-L's 118 data and 30 error correction code words, takes about 2 MB
+    and encodes a block in about 23 us instead of 36 us. A version 20-H
+    block only goes from 7.5 us to 7 us.
+    """
+    shape = (data_length, ecc_length)
+    if shape in _shape_tables:
+        rows = _shape_tables.pop(shape)
+        _shape_order.remove(shape)
+    else:
+        table = _feedback_table(ecc_length)
+        shift = (ecc_length - 1) * 8
+        mask = (1 << (ecc_length * 8)) - 1
+
+        #The last data byte contributes its feedback entry, every byte
+        #before it is followed by one more step with a zero input
+        rows = [table]
+        for i in range(1, data_length):
+            rows.append([((r << 8) & mask) ^ table[r >> shift]
+                         for r in rows[-1]])
+        rows.reverse()
+
+        _shape_counts.pop(shape, None)
+        while len(_shape_tables) >= max_shapes > 0:
+            del _shape_tables[_shape_order.pop(0)]
+
+    if max_shapes > 0:
+        _shape_tables[shape] = rows
+        _shape_order.append(shape)
+    return rows
+
+def _compiled_shape(data_length, ecc_length, count):
+    """Returns the compiled tables for the shape if they are cached, or
+    once *count* more blocks bring the shape to compile_after blocks.
+    Otherwise None is returned.
+    """
+    shape = (data_length, ecc_length)
+    if shape not in _shape_tables:
+        if compile_after is None:
+            return None
+        seen = _shape_counts.get(shape, 0) + count
+        if seen < compile_after:
+            _shape_counts[shape] = seen
+            return None
+    return compile_shape(data_length, ecc_length)
+
+def encode(data, ecc_length):
+    """Returns the *ecc_length* error correction code words of the block
+    of *data* code words as a bytearray. See encode_blocks().
+    """
+    return encode_blocks([data], ecc_length)[0]
+
+def encode_blocks(blocks, ecc_length):
+    """Returns a list holding the *ecc_length* error correction code words
+    of each of the data *blocks*, as bytearrays. The blocks may come from
+    any number of codes, as long as they all use the same number of error
+    correction code words, i.e. the codes have the same version and error
+    level. The blocks do not need to be the same length.
+
+    The remainder of the division by the generator polynomial is kept in
+    an integer register *ecc_length* bytes wide. Each data byte is added
+    to the register's top byte, the register is shifted by one byte, and
+    the generator multiplied by the outgoing byte is added back in. The
+    table and masks are set up once and shared by every block. Blocks
+    whose shape has been compiled are encoded by table lookups instead,
+    see compile_shape(). The NumPy backend is used instead when it is
+    selected, see set_backend().
+    """
+    if backend == 'numpy':
+        return _encode_blocks_numpy(blocks, ecc_length)
+
+    table = _feedback_table(ecc_length)
+    shift = (ecc_length - 1) * 8
+    mask = (1 << (ecc_length * 8)) - 1
+    hex_format = '{{0:0{0}x}}'.format(ecc_length * 2)
+    unhexlify = binascii.unhexlify
+    xor, lookup = operator.xor, list.__getitem__
+
+    counts = {}
+    for block in blocks:
+        counts[len(block)] = counts.get(len(block), 0) + 1
+    compiled = {}
+    for length, count in counts.items():
+        compiled[length] = _compiled_shape(length, ecc_length, count)
+
+    ecc_blocks = []
+    for block in blocks:
+        rows = compiled[len(block)]
+        if rows is not None:
+            register = reduce(xor, map(lookup, rows, bytearray(block)), 0)
+        else:
+            register = 0
+            for byte in bytearray(block):
+                register = ((register << 8) & mask) ^ \
+                           table[(register >> shift) ^ byte]
+        ecc_blocks.append(bytearray(unhexlify(hex_format.format(register))))
+    return ecc_blocks
+
+#: The NumPy feedback tables made by _numpy_feedback_table(), keyed by the
+#: number of error correction code words.
+_numpy_feedback_tables = {}
+
+def _numpy_feedback_table(ecc_length):
+    """Returns a 256 by *ecc_length* array of bytes. Each row holds the
+    coefficients of the generator polynomial multiplied by the row's
+    index.
+    """
+    numpy = _import_numpy()
+    if ecc_length not in _numpy_feedback_tables:
+        coefficients = generator(ecc_length)
+        table = bytearray(multiply(value, c) for value in range(256)
+                          for c in coefficients)
+        _numpy_feedback_tables[ecc_length] = \
+            numpy.frombuffer(bytes(table), dtype=numpy.uint8) \
+                 .reshape(256, ecc_length)
+    return _numpy_feedback_tables[ecc_length]
+
+def encode_array(data, ecc_length):
+    """Returns the *ecc_length* error correction code words of every row
+    of the 2-D NumPy array of bytes *data*, as a 2-D array with one row
+    for each block. This requires NumPy.
+
+    The division is done for all the rows at once. Every column of data
+    selects a row of the feedback table for each block, which is added
+    into the following *ecc_length* columns.
+    """
+    numpy = _import_numpy()
+    table = _numpy_feedback_table(ecc_length)
+    count, length = data.shape
+
+    work = numpy.zeros((count, length + ecc_length), dtype=numpy.uint8)
+    work[:, :length] = data
+    for column in range(length):
+        work[:, column + 1:column + 1 + ecc_length] ^= table[work[:, column]]
+    return work[:, length:]
+
+def _encode_blocks_numpy(blocks, ecc_length):
+    """This is encode_blocks() for the NumPy backend. Blocks of the same
+    length are stacked into one array and encoded by encode_array().
+    """
+    numpy = _import_numpy()
+    by_length = {}
+    for n, block in enumerate(blocks):
+        by_length.setdefault(len(block), []).append(n)
+
+    ecc_blocks = [None] * len(blocks)
+    for length, indexes in by_length.items():
+        data = numpy.frombuffer(b''.join(bytes(blocks[n]) for n in indexes),
+                                dtype=numpy.uint8)
+        ecc = encode_array(data.reshape(len(indexes), length), ecc_length)
+        for n, row in zip(indexes, ecc):
+            ecc_blocks[n] = bytearray(row.tobytes())
+    return ecc_blocks
+
+def encode_codes(codes, version, error):
+    """Splits the data code words of each of the *codes* into blocks and
+    computes their error correction code words. All the codes must have
+    the given *version* and *error* level, so every block of every code is
+    encoded by a single call to encode_blocks().
+
+    Returns a list holding a (data blocks, error correction blocks) tuple
+    for each code.
+    """
+    block_lists = [_split_blocks(code, version, error) for code in codes]
+
+    #All the blocks share the same number of error correction code words
+    ecc_length = tables.eccwbi[version][error][0]
+    all_blocks = [block for blocks in block_lists for block in blocks]
+    if backend == 'auto' and len(codes) > 1 and \
+       len(all_blocks) >= numpy_min_blocks and _import_numpy() is not None:
+        ecc_blocks = _encode_blocks_numpy(all_blocks, ecc_length)
+    else:
+        ecc_blocks = encode_blocks(all_blocks, ecc_length)
+
+    results = []
+    start = 0
+    for blocks in block_lists:
+        results.append((blocks, ecc_blocks[start:start + len(blocks)]))
+        start += len(blocks)
+    return results
+
+def _split_blocks(code_words, version, error):
+    """Slices the data *code_words* into the blocks of the given *version*
+    and *error* level. Some codes have two groups of blocks with different
+    sizes, for example two 14 word blocks followed by four 15 word blocks.
+    """
+    error_info = tables.eccwbi[version][error]
+    block_sizes = [error_info[2]] * error_info[1]
+    block_sizes.extend([error_info[4]] * error_info[3])
+
+    blocks = []
+    start = 0
+    for size in block_sizes:
+        blocks.append(code_words[start:start + size])
+        start += size
+
+    if start < len(code_words):
+        raise ValueError('Too much data for this code version.')
+    return blocks
@@ -4,7 +4,11 @@ Test against the buidler module.
 """
 from __future__ import unicode_literals
 from nose.tools import ok_, eq_, raises
-from pyqrcode import builder
+import nose
+import os
+import subprocess
+import sys
+from pyqrcode import builder, reedsolomon, tables
 
 
 def test_illegal_mode():
@@ -31,6 +35,376 @@ def test_illegal_version():
         ok_('41' in str(ex))
 
 
+def test_alphanumeric_encoding():
+    # Example from the standard, "AC-42" encodes as 00111001110 11100111001
+    # 000010 after the mode indicator and length field
+    qr = builder.QRCodeBuilder('AC-42', version=1, mode='alphanumeric',
+                               error='H')
+    eq_(builder.QRCodeBuilder('ac-42', version=1, mode='alphanumeric',
+                              error='H').code, qr.code)
+    qr.buffer = builder.BitBuffer()
+    qr.encode_alphanumeric(b'AC-42')
+    eq_('0011100111011100111001000010', qr.buffer.getvalue())
+
+
+@raises(ValueError)
+def test_alphanumeric_invalid():
+    builder.QRCodeBuilder('A#B', version=1, mode='alphanumeric', error='M')
+
+
+def test_binary_string():
+    qr = builder.QRCodeBuilder('abc\xff', version=1, mode='binary', error='M')
+    qr.buffer = builder.BitBuffer()
+    qr.encode_bytes('abc\xff')
+    eq_(bytearray(b'abc\xff'), qr.buffer.data)
+
+
+@raises(ValueError)
+def test_binary_string_wide_character():
+    builder.QRCodeBuilder('a\u263a', version=1, mode='binary', error='M')
+
+
+def test_classify():
+    eq_(('numeric', 'iso-8859-1', b'0123'),
+        builder._classify('0123', None))
+    eq_(('alphanumeric', 'ASCII', b'AC-42'),
+        builder._classify('AC-42', 'utf-8'))
+    eq_(('kanji', 'shiftjis', '点茗'.encode('shiftjis')),
+        builder._classify('点茗', None))
+    eq_(('binary', 'utf-8', 'Märchen'.encode('utf-8')),
+        builder._classify('Märchen', 'utf-8'))
+    eq_(('numeric', 'iso-8859-1', '42'), builder._classify(42, None))
+
+
+def test_kanji_encoding():
+    # Examples from the standard, 0x935F encodes as 0x0D9F and 0xE4AA
+    # encodes as 0x1AAA
+    qr = builder.QRCodeBuilder('点茗', version=1, mode='kanji', error='H')
+    qr.buffer = builder.BitBuffer()
+    qr.encode_kanji(b'\x93\x5f\xe4\xaa')
+    eq_('{0:013b}{1:013b}'.format(0x0D9F, 0x1AAA), qr.buffer.getvalue())
+
+
+def test_kanji_values_range():
+    eq_([0x8140, 0x9FFC, 0xE040, 0xEBBF],
+        list(builder._kanji_values(b'\x81\x40\x9f\xfc\xe0\x40\xeb\xbf')))
+    for data in (b'\x81\x3f', b'\x9f\xfd', b'\xa0\x40', b'\xeb\xc0',
+                 b'\x81', b''):
+        eq_(None, builder._kanji_values(data))
+
+
+def test_min_segments_length():
+    # A segment header, 3 digits, 2 letters and 2 other characters
+    eq_(4 + 8 + 10 + 11 + 16, builder._min_segments_length('123AB\xe4z', 1))
+    eq_(4 + 12 + 10 + 11 + 16, builder._min_segments_length(b'123ABxz', 40))
+    for data in ('http://example.org/item/12345678901234567890', '点茗 123'):
+        segments = builder._segment(data, 10)
+        ok_(builder._min_segments_length(data, 10) <=
+            builder._segments_length(segments, 10))
+
+
+def test_pick_version_skips_ranges():
+    versions = []
+
+    def segments_for(version):
+        versions.append(version)
+        return builder._segment(data, version)
+
+    # 2000 digits need at least 6679 bits, more than version 9 holds
+    data = '1' * 2000
+    eq_(20, builder._pick_version(segments_for, 'L', 0, data))
+    eq_([26], versions)
+    # Lower case letters need 16000 bits, only version 40 is segmented
+    del versions[:]
+    data = 'a' * 2000
+    eq_(33, builder._pick_version(segments_for, 'L', 0, data))
+    eq_([40], versions)
+    # No range can hold the data, so it is never segmented
+    del versions[:]
+    data = '1' * 8000
+    eq_(None, builder._pick_version(segments_for, 'L', 0, data))
+    eq_([], versions)
+
+
+def test_bitbuffer_write():
+    buf = builder.BitBuffer()
+    buf.write(0b101, 3)
+    eq_(0, len(buf.data))
+    eq_(3, len(buf))
+    # Crosses the first byte boundary and fills the second byte
+    buf.write(0b1100110011111, 13)
+    eq_(bytearray([0b10111001, 0b10011111]), buf.data)
+    eq_(0, buf.pending_length)
+    buf.write(0, 0)
+    eq_(16, len(buf))
+
+
+@raises(ValueError)
+def test_bitbuffer_write_too_wide():
+    builder.BitBuffer().write(0b100, 2)
+
+
+@raises(ValueError)
+def test_bitbuffer_write_negative():
+    builder.BitBuffer().write(-1, 8)
+
+
+def test_bitbuffer_write_bytes():
+    buf = builder.BitBuffer()
+    buf.write_bytes(b'\x41')
+    eq_(bytearray(b'\x41'), buf.data)
+    # On an unaligned buffer every byte is shifted across two bytes
+    buf.write(0b1, 1)
+    buf.write_bytes(b'\xff\x00')
+    eq_(bytearray([0x41, 0xff, 0x80]), buf.data)
+    eq_(1, buf.pending_length)
+    eq_(0, buf.pending)
+    buf.write_bytes(b'')
+    eq_(25, len(buf))
+
+
+def test_bitbuffer_write_fields():
+    buf = builder.BitBuffer()
+    buf.write(0b1, 1)
+    values = list(range(100))
+    buf.write_fields(values, 7)
+    eq_('1' + ''.join('{0:07b}'.format(value) for value in values),
+        buf.getvalue())
+
+
+def test_bitbuffer_getvalue():
+    buf = builder.BitBuffer(b'\x0f')
+    eq_('00001111', buf.getvalue())
+    buf.write(0b01, 2)
+    eq_('0000111101', buf.getvalue())
+    eq_(10, len(buf))
+
+
+def test_template_cache():
+    qr = builder.QRCodeBuilder('1', version=7, mode='numeric', error='L',
+                               keep_masks=True)
+    template = qr.make_template()
+    ok_(template is builder._templates[7])
+    ok_(template is qr.make_template())
+    eq_(45, len(template))
+    # Detection pattern corner, timing pattern and an untouched module
+    eq_((1, 1, 1, 1, 1, 1, 1, 0), template[0][:8])
+    eq_((1, 0, 1), template[6][8:11])
+    eq_(' ', template[-1][-1])
+    # An alignment pattern's center, data modules stay blank because the
+    # masks are copies
+    eq_(1, template[22][22])
+    ok_(qr.masks[0] is not template)
+    eq_(' ', template[20][18])
+
+
+def test_placement():
+    # Version 2 holds 44 code words and 7 remainder bits
+    qr = builder.QRCodeBuilder('1', version=2, mode='numeric', error='L')
+    positions = qr.make_placement()
+    ok_(positions is builder._placements[2])
+    eq_(44 * 8 + 7, len(positions))
+    eq_(len(positions), len(set(positions)))
+    # The first bits go up the two rightmost columns
+    eq_([24 * 25 + 24, 24 * 25 + 23, 23 * 25 + 24], list(positions[:3]))
+    template = qr.make_template()
+    ok_(all(template[i // 25][i % 25] == ' ' for i in positions))
+
+
+def test_gather():
+    qr = builder.QRCodeBuilder('1', version=2, mode='numeric', error='L')
+    gather = qr.make_gather()
+    ok_(gather is builder._gathers[2])
+    positions = qr.make_placement()
+    # Give every data bit its own value, the extra one is for the modules
+    # that hold no data
+    modules = gather(list(range(len(positions) + 1)))
+    eq_(25 * 25, len(modules))
+    for rank, index in enumerate(positions):
+        eq_(rank, modules[index])
+    eq_(25 * 25 - len(positions), modules.count(len(positions)))
+
+
+def test_mask_planes():
+    qr = builder.QRCodeBuilder('HELLO WORLD', version=3, mode='alphanumeric',
+                               error='Q', keep_masks=True)
+    template_plane, mask_planes = qr.make_planes()
+    ok_(mask_planes is builder._planes[3][1])
+    eq_(8, len(mask_planes))
+    # The top left module is dark and is never masked
+    ok_(template_plane >> (29 * 29 - 1))
+    ok_(not any(plane >> (29 * 29 - 1) for plane in mask_planes))
+    # Unmasking each data module gives the same bit for all eight masks
+    for index in qr.make_placement():
+        row, col = divmod(index, 29)
+        eq_(1, len(set(mask[row][col] ^ pattern(row, col) for mask, pattern
+                       in zip(qr.masks, tables.mask_patterns))))
+
+
+def test_type_planes():
+    qr = builder.QRCodeBuilder('1', version=1, mode='numeric', error='M',
+                               keep_masks=True)
+    type_planes = qr.make_type_planes()
+    ok_(type_planes is builder._type_planes[(1, 'M')])
+    eq_(8, len(type_planes))
+    for n, plane in enumerate(type_planes):
+        # Every bit of the type pattern is drawn twice
+        eq_(2 * tables.type_bits['M'][n].count('1'), bin(plane).count('1'))
+        # The mask's first bit goes in the module at row 8, column 0
+        eq_(int(tables.type_bits['M'][n][0]), (plane >> (21 * 13 - 1)) & 1)
+        eq_(qr.masks[n][8][0], (plane >> (21 * 13 - 1)) & 1)
+
+
+def test_row():
+    qr = builder.QRCodeBuilder('1', version=1, mode='numeric', error='L')
+    row = qr.code[0]
+    ok_(isinstance(row, bytearray))
+    eq_([1, 1, 1, 1, 1, 1, 1, 0], list(row[:8]))
+    eq_(list(row), row)
+    eq_(row, list(row))
+    ok_(row != list(row)[1:])
+    # Slices are rows too
+    ok_(isinstance(row[:8], builder._Row))
+    eq_([1, 1, 1, 1, 1, 1, 1, 0], row[:8])
+    eq_(list(row)[::2], row[::2])
+    eq_(1, row[0])
+    row[0] = ' '
+    eq_(builder._unset, row[0])
+
+
+def test_keep_masks():
+    qr = builder.QRCodeBuilder('1', version=1, mode='numeric', error='L')
+    eq_(None, qr.masks)
+    eq_(8, len(qr.scores))
+    qr = builder.QRCodeBuilder('1', version=1, mode='numeric', error='L',
+                               keep_masks=True)
+    eq_(8, len(qr.masks))
+    ok_(qr.code is qr.masks[qr.best_mask])
+
+
+#: The scores of the eight masks of 'HELLO WORLD' at error level Q, worked
+#: out with the original loop based scoring
+_golden_scores = {
+    1: [[177, 90, 80, 0], [172, 138, 160, 2], [205, 141, 160, 2],
+        [177, 144, 120, 2], [195, 144, 200, 0], [191, 165, 160, 0],
+        [172, 102, 40, 4], [198, 120, 240, 0]],
+    7: [[625, 432, 80, 2], [690, 732, 160, 2], [720, 504, 40, 2],
+        [574, 651, 40, 0], [523, 678, 120, 2], [587, 612, 400, 2],
+        [543, 615, 240, 4], [562, 624, 0, 0]],
+    40: [[8176, 8886, 1800, 0], [10112, 11829, 1000, 2], [9672, 9510, 640, 0],
+         [7835, 11652, 1760, 0], [7553, 11283, 760, 2], [9144, 12087, 1440, 0],
+         [8927, 12267, 1680, 2], [8870, 12267, 1240, 0]],
+}
+
+
+def check_penalty_scores(backend):
+    try:
+        builder.set_scoring_backend(backend)
+        for version, scores in _golden_scores.items():
+            qr = builder.QRCodeBuilder('HELLO WORLD', version, 'alphanumeric',
+                                       'Q', keep_masks=True)
+            eq_(scores, qr.scores)
+            totals = [sum(score) for score in scores]
+            eq_(totals.index(min(totals)), qr.best_mask)
+    finally:
+        builder.set_scoring_backend('auto')
+
+
+def test_penalty_scores():
+    check_penalty_scores('python')
+
+
+def test_penalty_scores_numpy():
+    if reedsolomon._import_numpy() is None:
+        raise nose.SkipTest()
+    check_penalty_scores('numpy')
+
+
+def check_penalty_scores_bounded(backend):
+    try:
+        builder.set_scoring_backend(backend)
+        counts = dict(builder.penalty_counts)
+        skipped = 0
+        for version, golden in _golden_scores.items():
+            qr = builder.QRCodeBuilder('HELLO WORLD', version, 'alphanumeric',
+                                       'Q')
+            totals = [sum(score) for score in golden]
+            eq_(totals.index(min(totals)), qr.best_mask)
+            eq_(golden[qr.best_mask], qr.scores[qr.best_mask])
+            for scores, golden_scores in zip(qr.scores, golden):
+                for score, golden_score in zip(scores, golden_scores):
+                    ok_(score in (None, golden_score))
+            eq_(sum(scores.count(None) for scores in qr.scores),
+                qr.skipped_rules)
+            skipped += qr.skipped_rules
+        eq_(counts['skipped'] + skipped, builder.penalty_counts['skipped'])
+        eq_(counts['scored'] + 32 * len(_golden_scores) - skipped,
+            builder.penalty_counts['scored'])
+    finally:
+        builder.set_scoring_backend('auto')
+
+
+def test_penalty_scores_bounded():
+    check_penalty_scores_bounded('python')
+
+
+def test_penalty_scores_bounded_numpy():
+    if reedsolomon._import_numpy() is None:
+        raise nose.SkipTest()
+    check_penalty_scores_bounded('numpy')
+
+
+def test_penalty_scores_bounded_tie():
+    # Identical masks tie, the first one wins and the others stop before
+    # their last rule
+    matrix = [[0] * 21 for i in range(21)]
+    scores, best, skipped = builder._penalty_scores_bounded([matrix] * 8)
+    eq_(0, best)
+    eq_(builder._penalty_scores(matrix), scores[0])
+    eq_(7, skipped)
+
+
+def test_penalty_scores_bounded_numpy_tie():
+    if reedsolomon._import_numpy() is None:
+        raise nose.SkipTest()
+    matrix = [[0] * 21 for i in range(21)]
+    scores, best, skipped = builder._penalty_scores_bounded_numpy([matrix] * 8)
+    eq_(0, best)
+    eq_(builder._penalty_scores(matrix), scores[0])
+    eq_(7, skipped)
+
+
+def test_penalty_counts_fast():
+    # The approximate scores of the 'fast' policy are not counted
+    counts = dict(builder.penalty_counts)
+    builder.QRCodeBuilder('HELLO WORLD', 1, 'alphanumeric', 'Q', mask='fast')
+    eq_(counts, builder.penalty_counts)
+
+
+def test_numpy_not_imported():
+    # NumPy is slow to import, building a code must not import it, even
+    # a version 40-H code with its 81 blocks
+    script = ('import sys, pyqrcode; pyqrcode.create("HELLO WORLD"); '
+              'pyqrcode.create("HELLO WORLD", error="H", version=40); '
+              'print("numpy" in sys.modules)')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=root,
+                               stdout=subprocess.PIPE)
+    eq_(b'False', process.communicate()[0].strip())
+
+
+@raises(ValueError)
+def test_set_scoring_backend_invalid():
+    builder.set_scoring_backend('gpu')
+
+
+def test_penalty_rules():
+    # Five dark runs in each direction, 16 blocks and 100% dark
+    eq_([30, 48, 0, 100], builder._penalty_scores([[1] * 5] * 5))
+    # The first row holds both rule 3 patterns, the rest is light
+    row = [0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0]
+    eq_([372, 564, 80, 94], builder._penalty_scores([row] + [[0] * 15] * 14))
+
 
 if __name__ == '__main__':
     import nose
@@ -65,10 +65,46 @@ def test_invalid_mode_provided():
 
 def test_binary_data():
     qr = pyqrcode.create('Märchenbuch'.encode('utf-8'), encoding='utf-8')
-    eq_('Märchenbuch', qr.data)
+    eq_('Märchenbuch'.encode('utf-8'), qr.data)
     eq_('binary', qr.mode)
 
 
+def test_binary_data_not_copied():
+    data = bytearray(b'\x00\xff' * 100)
+    view = memoryview(data)
+    qr = pyqrcode.create(view)
+    eq_('binary', qr.mode)
+    ok_(qr.data is view)
+    eq_(pyqrcode.create(bytes(data)).code, qr.code)
+    eq_(pyqrcode.create(data).code, qr.code)
+
+
+def test_binary_data_forced_kanji():
+    # Bytes that could be kanji keep their own bytes in the binary mode,
+    # after the mode indicator and the 8 bit length field
+    for data, encoding in (('日本語'.encode('utf-8'), 'utf-8'),
+                           (b'\xb0\xb1', 'iso-8859-1')):
+        qr = pyqrcode.create(data, mode='binary', encoding=encoding)
+        eq_('binary', qr.mode)
+        eq_(data, qr.data)
+        eq_(''.join('{0:08b}'.format(b) for b in bytearray(data)),
+            qr.builder.buffer.getvalue()[12:12 + 8 * len(data)])
+    eq_('kanji', pyqrcode.create(b'\xb0\xb1', encoding='iso-8859-1').mode)
+
+
+def test_binary_data_strided_view():
+    data = bytearray(b'abcdefgh')
+    qr = pyqrcode.create(memoryview(data)[::2])
+    eq_(pyqrcode.create(b'aceg').code, qr.code)
+
+
+def test_kanji_bytearray():
+    data = bytearray('点茗'.encode('shiftjis'))
+    qr = pyqrcode.create(data)
+    eq_('kanji', qr.mode)
+    eq_(pyqrcode.create('点茗').code, qr.code)
+
+
 def test_unicode_utf8():
     s = '\u263A'  # ☺ (WHITE SMILING FACE)
     try:
@@ -148,6 +184,208 @@ def test_to_str():
     ok_(str(pyqrcode.create(s)))
 
 
+def test_numeric_full_capacity_int():
+    # Far longer than str() allows on newer Pythons
+    number = (10 ** 7089 - 1) // 9 * 7
+    qr = pyqrcode.create(number, error='L')
+    eq_('numeric', qr.mode)
+    eq_(40, qr.version)
+    eq_('7' * 7089, qr.data)
+
+
+def test_numeric_int_str_bytes_agree():
+    code = pyqrcode.create('0123456789012', mode='numeric').code
+    eq_(code, pyqrcode.create(b'0123456789012').code)
+    code = pyqrcode.create('123456789012').code
+    eq_(code, pyqrcode.create(123456789012).code)
+
+
+def test_numeric_bytes_detection():
+    eq_('numeric', pyqrcode.create(b'0123456789').mode)
+
+
+@raises(ValueError)
+def test_numeric_invalid_digits():
+    from pyqrcode import builder
+    builder.QRCodeBuilder('12a', version=1, mode='numeric', error='M')
+
+
+def test_mixed_mode_segments():
+    qr = pyqrcode.create('http://example.org/item/12345678901234567890',
+                         error='H', mode='mixed')
+    eq_('mixed', qr.mode)
+    eq_([(4, b'http://example.org/item/'), (1, '12345678901234567890')],
+        qr.builder.segments)
+    # The numeric segment saves a version over pure binary
+    eq_(4, qr.version)
+    eq_(5, pyqrcode.create(qr.data, error='H').version)
+
+
+def test_mixed_mode_kanji():
+    qr = pyqrcode.create('ID 点茗 123456789', mode='mixed')
+    eq_([2, 8, 2, 1], [mode for mode, data in qr.builder.segments])
+    eq_('点茗'.encode('shiftjis'), qr.builder.segments[1][1])
+
+
+def test_mixed_mode_bytes():
+    qr = pyqrcode.create(b'HELLO 1234567890123 x', mode='mixed')
+    eq_([(2, b'HELLO '), (1, b'1234567890123'), (4, b' x')],
+        qr.builder.segments)
+
+
+def test_mixed_mode_single_segment():
+    qr = pyqrcode.create(1234567890, mode='mixed')
+    eq_([(1, '1234567890')], qr.builder.segments)
+
+
+@raises(ValueError)
+def test_mixed_mode_unencodable():
+    pyqrcode.create('\u263A', mode='mixed')
+
+
+def test_estimate():
+    for data, mode in _DATA_AUTODETECT:
+        for error in 'LH':
+            qr = pyqrcode.create(data, error=error)
+            info = pyqrcode.estimate(data, error=error, scale=3)
+            eq_(qr.version, info['version'])
+            eq_(qr.mode, info['mode'])
+            eq_(len(qr.code), info['modules'])
+            eq_(qr.get_png_size(3), info['size'])
+
+
+def test_estimate_bits():
+    # Mode indicator, 10 bit length field and 20 digits
+    eq_(4 + 10 + 67, pyqrcode.estimate('12345678901234567890')['bits'])
+    info = pyqrcode.estimate('http://example.org/item/12345678901234567890',
+                             mode='mixed')
+    eq_('mixed', info['mode'])
+    eq_(4 + 8 + (24 * 8) + 4 + 10 + 67, info['bits'])
+
+
+def test_estimate_is_not_a_code():
+    # The helpers share the content checks, but only built codes are QRCodes
+    estimate = pyqrcode._Estimate('HELLO', error='M')
+    eq_(1, estimate.version)
+    ok_(not isinstance(estimate, pyqrcode.QRCode))
+    ok_(not isinstance(pyqrcode._Sequence('HELLO'), pyqrcode.QRCode))
+
+
+@raises(ValueError)
+def test_estimate_too_large():
+    pyqrcode.estimate('A' * 5000)
+
+
+def test_version_exact_fit():
+    # 3515 digits need 4 + 14 + 11710 + 7 = 11735 bits, version 27-L holds
+    # 11744 bits, even though its character capacity is listed as 3514
+    # digits
+    info = pyqrcode.estimate('7' * 3515, error='L')
+    eq_(11735, info['bits'])
+    eq_(27, info['version'])
+    # The smallest version of each data length field range
+    eq_(1, pyqrcode.estimate('a' * 17, error='L')['version'])
+    eq_(10, pyqrcode.estimate('a' * 231, error='L')['version'])
+    eq_(27, pyqrcode.estimate('a' * 1368, error='L')['version'])
+
+
+def test_sequence():
+    data = 'HELLO WORLD ' * 100
+    codes = pyqrcode.create_sequence(data, error='M', max_version=10)
+    eq_(4, len(codes))
+    eq_(data.encode('ascii'), b''.join(code.data for code in codes))
+    for n, code in enumerate(codes):
+        eq_('alphanumeric', code.mode)
+        ok_(code.version <= 10)
+        eq_((n, 4, 0), code.sequence)
+
+
+def test_sequence_header():
+    # Version 1 codes have a single data block, so the header comes first:
+    # the mode indicator, the position, the number of codes minus one and
+    # the parity of the data
+    code, = pyqrcode.create_sequence(b'ab\x01')
+    eq_('0011' '0000' '0000' '{0:08b}'.format(0x61 ^ 0x62 ^ 0x01),
+        code.builder.buffer.getvalue()[:20])
+
+
+def test_sequence_kanji():
+    codes = pyqrcode.create_sequence('点茗' * 30, max_version=3)
+    ok_(len(codes) > 1)
+    for code in codes:
+        eq_('kanji', code.mode)
+        eq_(0, len(code.data) % 2)
+
+
+def test_sequence_binary():
+    # The pairs of bytes could be read as Shift-JIS kanji, the pieces must
+    # keep the bytes as they are
+    data = b'x' + b'\xb0\xb1' * 200
+    codes = pyqrcode.create_sequence(data, error='M', max_version=5)
+    eq_(data, b''.join(code.data for code in codes))
+    parity = 0
+    for byte in bytearray(data):
+        parity ^= byte
+    for n, code in enumerate(codes):
+        eq_('binary', code.mode)
+        eq_((n, len(codes), parity), code.sequence)
+
+
+@raises(ValueError)
+def test_sequence_too_large():
+    pyqrcode.create_sequence('A' * 1000, max_version=2)
+
+
+def test_sequence_argument():
+    qr = pyqrcode.QRCode('HELLO', sequence=(15, 16, 255))
+    eq_('0011' '1111' '1111' '11111111', qr.builder.buffer.getvalue()[:20])
+    for sequence in ((16, 17, 0), (0, 1, 300), (-1, 2, 0), (2, 2, 0),
+                     (0, 0, 0), (0.5, 2, 0), (0, 2), 'abc', 3):
+        try:
+            pyqrcode.QRCode('HELLO', sequence=sequence)
+            raise Exception('Expected an error for {0!r}'.format(sequence))
+        except ValueError:
+            pass
+
+
+def test_keep_masks():
+    qr = pyqrcode.create('HELLO WORLD')
+    eq_(None, qr.builder.masks)
+    qr_masks = pyqrcode.create('HELLO WORLD', keep_masks=True)
+    eq_(8, len(qr_masks.builder.masks))
+    eq_(qr.code, qr_masks.code)
+
+
+def test_mask():
+    qr = pyqrcode.create('HELLO WORLD')
+    eq_(qr.builder.best_mask, qr.mask)
+    for mask in range(8):
+        qr_mask = pyqrcode.create('HELLO WORLD', mask=mask)
+        eq_(mask, qr_mask.mask)
+        eq_(None, qr_mask.builder.scores)
+        if mask == qr.mask:
+            eq_(qr.code, qr_mask.code)
+        else:
+            ok_(qr.code != qr_mask.code)
+
+
+def test_mask_fast():
+    qr = pyqrcode.create('HELLO WORLD', mask='fast', keep_masks=True)
+    totals = [sum(scores) for scores in qr.builder.scores]
+    eq_(totals.index(min(totals)), qr.mask)
+    eq_(qr.builder.masks[qr.mask], qr.code)
+
+
+@raises(ValueError)
+def test_invalid_mask():
+    pyqrcode.create('test', mask=8)
+
+
+@raises(ValueError)
+def test_invalid_mask2():
+    pyqrcode.create('test', mask='best')
+
+
 @raises(ValueError)
 def test_invalid_version():
     pyqrcode.create('test', version=41)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""\
+Test against the reedsolomon module.
+"""
+from __future__ import unicode_literals
+from nose.tools import eq_, ok_, raises
+import nose
+import random
+from pyqrcode import reedsolomon, tables
+
+
+def test_encode():
+    # "HELLO WORLD" as a version 1-M code, from the thonky.com tutorial
+    data = [32, 91, 11, 120, 209, 114, 220, 77, 67, 64, 236, 17, 236, 17,
+            236, 17]
+    eq_(bytearray([196, 35, 39, 119, 235, 215, 231, 226, 93, 23]),
+        reedsolomon.encode(bytearray(data), 10))
+
+
+def test_encode_zeros():
+    eq_(bytearray(30), reedsolomon.encode(bytearray(118), 30))
+
+
+def test_multiply():
+    eq_(0, reedsolomon.multiply(0, 7))
+    eq_(1, reedsolomon.multiply(142, 2))
+    # alpha^254 * alpha^254 == alpha^253
+    eq_(reedsolomon.exp[253], reedsolomon.multiply(reedsolomon.exp[254],
+                                                   reedsolomon.exp[254]))
+
+
+def test_generator():
+    eq_(bytearray([127, 122, 154, 164, 11, 68, 117]),
+        reedsolomon.generator(7))
+
+
+def test_encode_codes():
+    # Version 5-Q has two 15 word blocks and two 16 word blocks
+    codes = [bytearray(range(n, n + 62)) for n in (0, 100)]
+    results = reedsolomon.encode_codes(codes, 5, 'Q')
+    eq_(2, len(results))
+    for code, (blocks, ecc_blocks) in zip(codes, results):
+        eq_([15, 15, 16, 16], [len(block) for block in blocks])
+        eq_(code, bytearray().join(blocks))
+        eq_([reedsolomon.encode(block, 18) for block in blocks], ecc_blocks)
+
+
+def test_numpy_backend():
+    if reedsolomon._import_numpy() is None:
+        raise nose.SkipTest()
+    random.seed(0)
+    for ecc_length in tables.generator_polynomials:
+        blocks = [bytearray(random.randrange(256) for _ in range(length))
+                  for length in (1, 15, 16, 118, 15)]
+        try:
+            reedsolomon.set_backend('numpy')
+            result = reedsolomon.encode_blocks(blocks, ecc_length)
+        finally:
+            reedsolomon.set_backend('auto')
+        eq_([reedsolomon.encode(block, ecc_length) for block in blocks],
+            result)
+
+
+def test_set_backend():
+    try:
+        reedsolomon.set_backend('python')
+        eq_('python', reedsolomon.backend)
+        eq_(bytearray(10), reedsolomon.encode_blocks([bytearray(16)], 10)[0])
+    finally:
+        reedsolomon.set_backend('auto')
+    eq_('auto', reedsolomon.backend)
+
+
+def test_compile_shape():
+    random.seed(1)
+    blocks = [bytearray(random.randrange(256) for _ in range(length))
+              for length in (15, 16, 15, 16)]
+    expected = [reedsolomon.encode(block, 18) for block in blocks]
+    eq_(16, len(reedsolomon.compile_shape(16, 18)))
+    eq_(256, len(reedsolomon.compile_shape(15, 18)[0]))
+    try:
+        reedsolomon.set_backend('python')
+        eq_(expected, reedsolomon.encode_blocks(blocks, 18))
+    finally:
+        reedsolomon.set_backend('auto')
+
+
+def test_compile_after():
+    blocks = [bytearray(20)] * 4
+    ok_((20, 10) not in reedsolomon._shape_tables)
+    reedsolomon.encode_blocks(blocks, 10)
+    ok_((20, 10) not in reedsolomon._shape_tables)
+    try:
+        reedsolomon.set_backend('python')
+        reedsolomon.compile_after = 6
+        reedsolomon.encode_blocks(blocks, 10)
+        ok_((20, 10) not in reedsolomon._shape_tables)
+        eq_([bytearray(10)] * 4, reedsolomon.encode_blocks(blocks, 10))
+        ok_((20, 10) in reedsolomon._shape_tables)
+    finally:
+        reedsolomon.compile_after = None
+        reedsolomon.set_backend('auto')
+
+
+def test_compile_shape_lru():
+    max_shapes = reedsolomon.max_shapes
+    try:
+        reedsolomon.max_shapes = 2
+        for length in (10, 11, 12, 11):
+            reedsolomon.compile_shape(length, 7)
+        eq_([(12, 7), (11, 7)], reedsolomon._shape_order[-2:])
+        ok_((10, 7) not in reedsolomon._shape_tables)
+        eq_(set(reedsolomon._shape_order), set(reedsolomon._shape_tables))
+    finally:
+        reedsolomon.max_shapes = max_shapes
+
+
+@raises(ValueError)
+def test_set_backend_invalid():
+    reedsolomon.set_backend('fortran')
+
+
+if __name__ == '__main__':
+    import nose
+    nose.core.runmodule()